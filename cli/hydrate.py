@@ -1,15 +1,22 @@
 #!/usr/bin/env python3.12
 # -*- coding: utf-8 -*-
 import argparse
+import concurrent.futures
 import csv
+import hashlib
+import io
 import logging
+import multiprocessing
+import os
 import pathlib
 import pprint
 import shutil
+import stat
 import subprocess
 import sys
 import tempfile
 import typing
+import zipfile
 
 import jinja2
 
@@ -20,6 +27,26 @@ logger.setLevel(logging.WARN)
 
 ConfigDict = typing.Dict[str, dict[str, str]]
 
+_READ_BUFSIZE = 1 << 20  # 1 MiB
+
+# Jinja environment config shared by every environment; templates render YAML, so HTML autoescaping
+# is disabled for them
+_JINJA_OPTIONS = dict(trim_blocks=True, lstrip_blocks=True)
+_JINJA_AUTOESCAPE = dict(disabled_extensions=('j2', 'yaml', 'yml'), default=False)
+# the bytecode cache only validates template source, not the options used to compile it, so key the
+# cache files on those options
+_JINJA_CACHE_KEY = hashlib.sha1(repr((_JINJA_OPTIONS, _JINJA_AUTOESCAPE)).encode()).hexdigest()
+
+# Jinja template loader prefixes for each template source (see `setup_jinja`)
+_BASE_TEMPLATES = 'base'
+_OVERLAY_TEMPLATES = 'overlay'
+
+# zip member holding the template sources digest in a precompiled templates zip
+_COMPILED_DIGEST_NAME = 'SOURCES_DIGEST'
+
+# per-process state for cluster hydration workers; populated by `_init_worker`
+_worker_context: typing.Optional[tuple[argparse.Namespace, jinja2.Environment]] = None
+
 
 class CustomHelpFormatter(argparse.HelpFormatter):
     def format_help(self):
@@ -27,6 +54,24 @@ class CustomHelpFormatter(argparse.HelpFormatter):
         return original_help + "  --\t\t\tkustomize command overide \n"
 
 
+class _Lazy:
+    """
+    Defers building a log message argument until it's formatted, i.e. only if the message will be
+    emitted.
+
+    Usage:
+    ```
+    logger.debug('config: %s', _Lazy(lambda: pprint.pformat(config)))
+    ```
+    """
+
+    def __init__(self, func: typing.Callable[[], str]):
+        self.func = func
+
+    def __str__(self) -> str:
+        return self.func()
+
+
 class TempDir:
     """
     Represents a dir which is intended to be ephemeral.  Intended to be used as an `argparse`
@@ -113,7 +158,12 @@ class LazyFileType(argparse.FileType):
         return self
 
     def open(self) -> typing.IO:
-        return open(self.filename, self._mode, self._bufsize, self._encoding,
+        bufsize = self._bufsize
+        # use a large read buffer unless one was explicitly requested; avoids many small reads on
+        # large files and network filesystems
+        if bufsize == -1 and 'r' in self._mode:
+            bufsize = _READ_BUFSIZE
+        return open(self.filename, self._mode, bufsize, self._encoding,
                     self._errors)
 
     @classmethod
@@ -123,72 +173,177 @@ class LazyFileType(argparse.FileType):
         return inst
 
 
-def is_jinja_template(dest_file: pathlib.Path) -> bool:
+def positive_int(string: str) -> int:
+    """
+    `argparse` argument type for an integer >= 1
+    :param string: argument value
+    :raises argparse.ArgumentTypeError: if the value isn't an integer >= 1
+    :return: parsed integer
+    """
+    try:
+        value = int(string)
+    except ValueError:
+        value = 0
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"invalid value '{string}': must be an integer >= 1")
+    return value
+
+
+def is_jinja_template(dest_file: pathlib.PurePath | os.DirEntry) -> bool:
     """
     Check if file is a jinja template
-    :param dest_file: file to check
+    :param dest_file: file to check; anything with a `name` (`pathlib.PurePath`, `os.DirEntry`)
     :return: bool indicating if jinja template or not
     """
-    return dest_file.suffix == '.j2'
+    return dest_file.name.endswith('.j2')
 
 
-def setup_jinja(template_path: pathlib.Path) -> jinja2.Environment:
+def setup_jinja(base_dir: pathlib.Path, overlay_root: pathlib.Path,
+                compiled_templates: typing.Optional[pathlib.Path] = None) -> jinja2.Environment:
     """
-    Setup jinja environment and return
-    :param template_path: path to use for jinja loader `jinja2.FileSystemLoader`
+    Setup jinja environment and return.  The environment is intended to be long-lived and shared
+    across clusters; compiled templates are cached in memory for the life of the environment and
+    on disk (per-user dir under the system temp dir) across invocations.  Templates are loaded by
+    source: `base/<path relative to base_dir>` and `overlay/<path relative to overlay_root>`
+    :param base_dir: path to base directory
+    :param overlay_root: path to overlays directory
+    :param compiled_templates: optional zip of precompiled templates (see `compile_templates`);
+        templates in it are loaded with `jinja2.ModuleLoader` instead of being compiled from
+        source, while any others fall back to the source dirs
     :return: `jinja2.Environment`
     """
-    logger.debug(f'Setting up Jinja with template loader path: {template_path}')
+    logger.debug(f'Setting up Jinja with template loader paths: {base_dir}, {overlay_root}')
+    loader = jinja2.PrefixLoader({
+        _BASE_TEMPLATES: jinja2.FileSystemLoader(base_dir),
+        _OVERLAY_TEMPLATES: jinja2.FileSystemLoader(overlay_root),
+    })
+    if compiled_templates is not None:
+        logger.debug(f'Using precompiled templates: {compiled_templates}')
+        loader = jinja2.ChoiceLoader([jinja2.ModuleLoader(compiled_templates), loader])
+
     return jinja2.Environment(
-        loader=jinja2.FileSystemLoader(template_path),
-        autoescape=True
+        loader=loader,
+        # no directory: Jinja uses a private (0700, owner-checked) per-user dir under the system
+        # temp dir, so other users can't plant cached bytecode
+        bytecode_cache=jinja2.FileSystemBytecodeCache(None,
+                                                      f'__jinja2_{_JINJA_CACHE_KEY}_%s.cache'),
+        auto_reload=False,
+        autoescape=jinja2.select_autoescape(**_JINJA_AUTOESCAPE),
+        **_JINJA_OPTIONS
     )
 
 
-def template_file(template_file: pathlib.Path, cluster_config: dict, jinja_env: jinja2.Environment,
-                  delete_template: bool = False):
+def templates_digest(base_dir: pathlib.Path, overlay_root: pathlib.Path) -> str:
     """
-    Jinja template a file to the same name, minus a `.j2` extension, and optionally delete when
-    complete
-    :param template_file: path to template file (should be a Jinja template with a `.j2` extension)
-    :param cluster_config: cluster config dict
-    :param jinja_env: jinja environment to search for template in `template_file`
-    :param delete_template: whether to delete original template file
+    Compute a digest of all Jinja templates (names and contents) found in the base and overlays
+    dirs, along with the Jinja environment options they're compiled with
+    :param base_dir: path to base directory
+    :param overlay_root: path to overlays directory
+    :return: hex digest
+    """
+    digest = hashlib.sha1(_JINJA_CACHE_KEY.encode())
+    for loader_prefix, source_dir in ((_BASE_TEMPLATES, base_dir),
+                                      (_OVERLAY_TEMPLATES, overlay_root)):
+        prefix = os.path.join(source_dir, '')
+        for path in sorted(e.path for e in _scan(source_dir) if is_jinja_template(e)):
+            digest.update(f'{loader_prefix}/{path[len(prefix):]}'.encode())
+            with open(path, 'rb') as f:
+                digest.update(hashlib.sha1(f.read()).digest())
+    return digest.hexdigest()
+
+
+def compiled_templates_current(target: pathlib.Path, digest: str) -> bool:
+    """
+    Check whether a zip of precompiled templates was compiled from templates matching `digest`
+    :param target: zip file written by `compile_templates`
+    :param digest: digest of current template sources (see `templates_digest`)
+    :return: bool indicating if the zip exists and is up to date
+    """
+    try:
+        with zipfile.ZipFile(target) as z:
+            return z.read(_COMPILED_DIGEST_NAME).decode() == digest
+    except (OSError, KeyError, zipfile.BadZipFile):
+        return False
+
+
+def compile_templates(jinja_env: jinja2.Environment, target: pathlib.Path, digest: str) -> None:
+    """
+    Compile all Jinja templates from the environment's loader (base and overlays dirs) ahead of
+    time into a zip file for use with `setup_jinja(compiled_templates=...)`.  Compiled templates
+    aren't checked against their source when loaded, so the digest of the sources is stored in the
+    zip for `compiled_templates_current` to check
+    :param jinja_env: jinja environment (from `setup_jinja` without `compiled_templates`) to
+        compile templates with
+    :param target: zip file to write (overwritten if it exists)
+    :param digest: digest of template sources (see `templates_digest`)
     :return: None
     """
-    # compute relative path from Jinja environment template loader path to source template
-    loader_path = pathlib.Path(jinja_env.loader.searchpath[0]).resolve()
-    template_relative_path = template_file.relative_to(loader_path)
-    logger.debug(f'Template relative path: {template_relative_path}')
+    logger.info(f'Compiling templates to {target}')
+    jinja_env.compile_templates(
+        target,
+        filter_func=lambda name: name.endswith('.j2'),
+        zip='deflated',
+        log_function=logger.debug
+    )
+    with zipfile.ZipFile(target, 'a') as z:
+        z.writestr(_COMPILED_DIGEST_NAME, digest)
+
 
+def template_file(template_name: str, cluster_config: dict, jinja_env: jinja2.Environment,
+                  *, dest_file: str):
+    """
+    Jinja template a file to `dest_file`, minus its `.j2` extension
+    :param template_name: name of the template (should have a `.j2` extension) as known to the
+        Jinja environment loader, i.e. prefixed by its source (see `setup_jinja`)
+    :param cluster_config: cluster config dict
+    :param jinja_env: jinja environment to search for template in `template_name`
+    :param dest_file: destination path of the template; rendered to the same path minus `.j2`
+    :raises RuntimeWarning: if the template can't be found or rendered
+    :return: None
+    """
     try:
-        template = jinja_env.get_template(str(template_relative_path))
+        template = jinja_env.get_template(template_name)
     except jinja2.exceptions.TemplateError as e:
-        logger.exception(f'Error getting template {template_file}')
+        logger.exception(f'Error getting template {template_name}')
         raise RuntimeWarning('Error getting template') from e
-    file_path = template_file.parent.joinpath(template_file.stem)
-    logger.info(f"Rendering template '{template_file.name}' to {file_path}")
+    file_path = dest_file[:-3]  # strip `.j2`
+    logger.info("Rendering template '%s' to %s", template_name, file_path)
     with open(file_path, 'w') as f:
         try:
-            f.write(template.render(**cluster_config))
+            template.stream(**cluster_config).dump(f)
         except jinja2.exceptions.TemplateError as e:
-            logger.exception(f'Error rendering template {template_file}')
+            logger.exception(f'Error rendering template {template_name}')
             raise RuntimeWarning('Error rendering template') from e
-        logger.debug(f'Wrote {f.tell()} bytes to {file_path}')
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('Wrote %d bytes to %s', f.tell(), file_path)
 
-    if delete_template is True:
-        logger.info(f"Deleting template '{template_file.name}'")
-        template_file.unlink()
+
+def _scan(root: str | os.PathLike) -> typing.Iterator[os.DirEntry]:
+    """
+    Recursively scan a directory, yielding an `os.DirEntry` for every entry; directories are
+    yielded before their contents.  Uses `os.scandir` so that entry type information is reused
+    rather than re-`stat`ed
+    :param root: directory to scan
+    :return: iterator of `os.DirEntry`
+    """
+    with os.scandir(root) as it:
+        for entry in it:
+            yield entry
+            if entry.is_dir(follow_symlinks=False):
+                yield from _scan(entry.path)
 
 
-def copy_and_template(base_dir: pathlib.Path, overlay_dir: pathlib.Path, *, dest_dir: pathlib.Path,
-                      cluster_config: dict, jinja_env: jinja2.Environment, template: bool = True):
+def copy_and_template(base_dir: pathlib.Path, overlay_dir: pathlib.Path, *,
+                      overlay_root: pathlib.Path, dest_dir: pathlib.Path, cluster_config: dict,
+                      jinja_env: jinja2.Environment, template: bool = True):
     """
     Recursively walks sources (base and overlay dirs), creating an identical directory structure
     in `dest_dir`, and copies files from sources to dest.  If Jinja templates are encountered, they
-    will be rendered in `dest_dir` if `template` is True.
+    will be rendered directly into `dest_dir` (without copying the template) if `template` is True.
     :param base_dir: path to base directory
     :param overlay_dir: path to overlay directory
+    :param overlay_root: path to overlays directory containing `overlay_dir` (possibly nested);
+        `overlay_dir` is copied to the same path relative to its parent in `dest_dir`
     :param dest_dir: destination directory for copying files (temp/scratch dir)
     :param cluster_config: configuration dict
     :param jinja_env: jinja environment to use for template rendering
@@ -196,34 +351,57 @@ def copy_and_template(base_dir: pathlib.Path, overlay_dir: pathlib.Path, *, dest
     :return: None
     """
 
-    def generate(b, o):
-        logger.debug(f'Traversing source base path: {b}')
-        yield from b.walk()
-        logger.debug(f'Traversing source overlay path: {o}')
-        yield from o.walk()
+    dest_root = os.fspath(dest_dir)
+    created: set[str] = set()  # dest dirs already created; avoids a stat per file
 
-    for (root, dirs, files) in generate(base_dir, overlay_dir):
-        files = (root.joinpath(pathlib.Path(file)) for file in files)
+    def makedirs(path):
+        if path not in created:
+            logger.debug("Creating directory: %s", path)
+            os.makedirs(path, exist_ok=True)
+            created.add(path)
 
-        # compute relative path from src root to copy into dest
-        try:
-            next_dir = dest_dir.joinpath(root.relative_to(base_dir.parent))
-        except ValueError:
-            next_dir = dest_dir.joinpath(root.relative_to(overlay_dir.parent))
-
-        if not next_dir.exists():
-            logger.debug(f"Creating directory: {next_dir}")
-            next_dir.mkdir(parents=True, exist_ok=True)
-
-        for file in files:
-            dest_file = next_dir.joinpath(file.name)
-            logger.debug(f'Copying {file} to {dest_file}')
-            shutil.copy2(file, dest_file)
-            if template is True and is_jinja_template(dest_file):
-                template_file(template_file=dest_file,
+    sources = (
+        # (dir to traverse, source root, template loader prefix); the source root's dir name is
+        # kept in dest (e.g. overlays/group)
+        (base_dir, base_dir, _BASE_TEMPLATES),
+        (overlay_dir, overlay_root, _OVERLAY_TEMPLATES),
+    )
+    for (src_dir, src_root, loader_prefix) in sources:
+        logger.debug('Traversing source %s path: %s', loader_prefix, src_dir)
+        # dest and template paths are computed by slicing these prefixes (with trailing separator)
+        # off of each entry rather than re-parsing the path.  Templates are looked up by source
+        # so a same-named template under another source can't be picked up instead
+        prefix = os.path.join(src_root.parent, '')
+        template_prefix = os.path.join(src_root, '')
+
+        # create the traversal root in dest up front, even if it has no files
+        makedirs(os.path.join(dest_root, os.fspath(src_dir)[len(prefix):]))
+
+        for entry in _scan(src_dir):
+            # directories are yielded before their contents; mirror them in dest, even if empty.
+            # symlinks to directories aren't followed (as with `Path.walk`)
+            if entry.is_dir():
+                if not entry.is_symlink():
+                    makedirs(os.path.join(dest_root, entry.path[len(prefix):]))
+                continue
+
+            # compute relative path from src root to copy into dest
+            next_dir = os.path.join(dest_root, os.path.dirname(entry.path)[len(prefix):])
+            dest_file = os.path.join(next_dir, entry.name)
+
+            # render templates straight from the source; no need to copy them first
+            if template is True and is_jinja_template(entry):
+                template_file(template_name=f'{loader_prefix}/{entry.path[len(template_prefix):]}',
                               cluster_config=cluster_config,
                               jinja_env=jinja_env,
-                              delete_template=True)
+                              dest_file=dest_file)
+                continue
+
+            # kustomize needs the mode (e.g. +x for exec plugins/KRM functions) but not
+            # timestamps, so use the `copyfile` fast path plus `copymode` rather than `copy2`
+            logger.debug('Copying %s to %s', entry.path, dest_file)
+            shutil.copyfile(entry.path, dest_file)
+            shutil.copymode(entry.path, dest_file)
 
     logger.debug('Done copying templates')
 
@@ -236,23 +414,44 @@ def process_sot_file(sot_f: typing.IO) -> ConfigDict:
     :raises RuntimeError: any failed check raises RuntimeError; all other exceptions are unexpected
     :return: parsed config as dict
     """
-    logger.debug(f"Processing source of truth file: {sot_f.name}")
-    reader = csv.DictReader(sot_f, dialect='excel')
+    logger.debug("Processing source of truth file: %s", sot_f.name)
+    reader = csv.reader(sot_f, dialect='excel')
     data: ConfigDict = {}
+    # strip the header once; each row is then stripped in bulk and zipped onto the columns
+    cols = tuple(map(str.strip, next(reader, ())))
+    if 'cluster_name' not in cols:
+        logger.error("Source of truth file missing 'cluster_name' column")
+        logger.debug('Got CSV header: %s', cols)
+        raise RuntimeError('Missing cluster_name')
+
     row: dict[str, str]
-    for row in reader:
-        row = {k.strip(): v.strip() for k, v in row.items() if row}
-        try:
-            data[row['cluster_name']] = row
-        except KeyError as e:
-            logger.error("Source of truth file missing 'cluster_name' column")
-            logger.debug(f'Got CSV: {row}')
-            raise RuntimeError from e
+    for raw_row in reader:
+        if not raw_row:
+            continue  # skip blank lines
+        row = dict(zip(cols, map(str.strip, raw_row)))
+        data[row['cluster_name']] = row
     return data
 
 
+def resolve_kustomize(command_override: typing.Optional[list] = None) -> str:
+    """
+    Resolve the kustomize command (or the first element of the command override) against `$PATH`.
+    Intended to be called once per run, before any clusters are processed
+    :param command_override: command override to kustomize, if any
+    :raise RuntimeError: if the command can't be found
+    :return: full path to command
+    """
+    cmd = command_override[0] if command_override else 'kustomize'
+    full_path_to_cmd = shutil.which(cmd)
+    if full_path_to_cmd is None:
+        err = f'Could not find {cmd} in the path'
+        logger.error(err)
+        raise RuntimeError(err)
+    return full_path_to_cmd
+
+
 def run_kustomize(*, output_dir: pathlib.Path, overlay_dir: pathlib.Path,
-                  cluster_config: dict[str, str],
+                  cluster_config: dict[str, str], kustomize_bin: str,
                   command_override: typing.Optional[list] = None) -> None:
     """
     Runs kustomize using `subprocess.Popen` and dumps the output to a specified location.  Pipes
@@ -261,8 +460,9 @@ def run_kustomize(*, output_dir: pathlib.Path, overlay_dir: pathlib.Path,
     :param overlay_dir: directory where overlay has been copied and templated (becomes kustomize
         cwd)
     :param cluster_config: cluster config as dict
+    :param kustomize_bin: full path to the command to run (see `resolve_kustomize`); replaces
+        the first element of the command
     :param command_override: command override to kustomize; if not specified, a default is used
-    :raise RuntimeError: if any issues are encountered at runtime; other exceptions are unexpected
     :return: None
     """
     filename = f'{cluster_config['cluster_name']}.yaml'
@@ -272,34 +472,26 @@ def run_kustomize(*, output_dir: pathlib.Path, overlay_dir: pathlib.Path,
                             str(output_dir.joinpath(filename).resolve())]
 
     orig_command = command_override[0]
-    full_path_to_cmd = shutil.which(orig_command)
-    if full_path_to_cmd is None:
-        err = f'Could not find {command_override[0]} in the path'
-        logger.error(err)
-        raise RuntimeError(err)
-
-    command_override[0] = full_path_to_cmd
-
-    logger.debug(f"Running '{" ".join(command_override)}'")
-    logger.info(f'Running {full_path_to_cmd}')
-    with subprocess.Popen(command_override, bufsize=1, text=True, stdout=subprocess.PIPE,
-                          stderr=subprocess.STDOUT, cwd=overlay_dir) as p:
-        while True:
-            stdout = p.stdout.read().strip('\n')
-            if stdout:
-                logger.info(f'{orig_command}: {stdout}')
-
-            # check to see if the process is complete and log status if so
-            # if not complete, continue the loop
-            if p.poll() is None:
-                continue
-            elif p.returncode == 0:
-                logger.info(
-                    f'{full_path_to_cmd} completed successfully with exitcode {p.returncode}')
-            elif p.returncode > 0:
-                logger.error(f'{full_path_to_cmd} exited with {p.returncode}')
-
-            break
+    full_path_to_cmd = kustomize_bin
+    command_override = [full_path_to_cmd, *command_override[1:]]
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Running '%s'", " ".join(command_override))
+    logger.info('Running %s', full_path_to_cmd)
+    with subprocess.Popen(command_override, bufsize=io.DEFAULT_BUFFER_SIZE, text=True,
+                          stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=overlay_dir) as p:
+        # read output line by line until the pipe is closed, then log the exit status
+        for line in p.stdout:
+            line = line.rstrip('\n')
+            if line:
+                logger.info('%s: %s', orig_command, line)
+
+        p.wait()
+        if p.returncode == 0:
+            logger.info('%s completed successfully with exitcode %d', full_path_to_cmd,
+                        p.returncode)
+        elif p.returncode > 0:
+            logger.error('%s exited with %d', full_path_to_cmd, p.returncode)
 
 
 def process_cluster(args: argparse.Namespace, config: dict[str, str],
@@ -322,15 +514,19 @@ def process_cluster(args: argparse.Namespace, config: dict[str, str],
                        f" nothing to hydrate")
         raise RuntimeWarning('No overlay')
 
+    # each cluster gets its own scratch subdir so the temp dir needn't be reset between clusters
+    scratch_dir = args.temp.path.joinpath(config['cluster_name'])
+
     # walk the sources (base and overlay), copy to temp dir, template if needed
     copy_and_template(base_dir=args.base,
                       overlay_dir=clus_overlay_dir,
-                      dest_dir=args.temp.path,
+                      overlay_root=args.overlay,
+                      dest_dir=scratch_dir,
                       cluster_config=config,
                       jinja_env=jinja_env)
 
     # setup hydration source and destination directories and ensure dest exists
-    hydration_src = args.temp.path.joinpath(args.overlay.name).joinpath(config['cluster_group'])
+    hydration_src = scratch_dir.joinpath(args.overlay.name).joinpath(config['cluster_group'])
     if output_subdir == 'cluster':
         hydrated_dest = args.hydrated.joinpath(config['cluster_name'])
     elif output_subdir == 'group':
@@ -344,9 +540,69 @@ def process_cluster(args: argparse.Namespace, config: dict[str, str],
     run_kustomize(output_dir=hydrated_dest,
                   overlay_dir=hydration_src,
                   cluster_config=config,
+                  kustomize_bin=args.kustomize_bin,
                   command_override=args.kustomize)
 
 
+def _select_cluster(cluster_name: str, cluster_config: dict, args: argparse.Namespace) -> bool:
+    """
+    Check a cluster's config and whether it matches the tag/group selectors provided as args
+    :param cluster_name: name of cluster
+    :param cluster_config: cluster config as dict
+    :param args: parsed command line arguments
+    :return: bool indicating whether the cluster should be hydrated
+    """
+    try:
+        check_config(cluster_config)
+    except RuntimeError:
+        return False  # if we encounter something "fatal" to the cluster, move onto the next
+
+    # if tags provided as args
+    if args.cluster_tag:
+        try:
+            config_tags = cluster_config['cluster_tags'].split(",")
+        except KeyError:
+            logger.warning(f"Cluster '{cluster_name}': specified tags as args but has none in "
+                           f"config file")
+            return False
+
+        # if config tags don't intersect with tags from args, then don't hydrate cluster
+        if args.cluster_tag.isdisjoint(t.strip() for t in config_tags):
+            logger.debug(f"Cluster '{cluster_name}': no matching tags, not hydrating...")
+            return False
+    if args.cluster_group_norm is not None:
+        if args.cluster_group_norm != cluster_config['cluster_group'].lower():
+            logger.debug(f"Cluster '{cluster_name}': not in group '{args.cluster_group}'; not "
+                         f"hydrating...")
+            return False
+
+    return True
+
+
+def _init_worker(args: argparse.Namespace, jinja_env: jinja2.Environment) -> None:
+    """
+    Initializer for cluster hydration worker processes.  Workers are forked, so `args` and
+    `jinja_env` are inherited rather than pickled.  Also called in-process when clusters are
+    hydrated sequentially
+    :param args: parsed command line arguments
+    :param jinja_env: jinja2 environment to use to render templates
+    :return: None
+    """
+    global _worker_context
+    _worker_context = (args, jinja_env)
+
+
+def _process_cluster_worker(config: dict[str, str]) -> None:
+    """
+    Process a given cluster in a worker process using the context set by `_init_worker`
+    :param config: cluster configuration as dict
+    :return: None
+    """
+    args, jinja_env = _worker_context
+    logger.info(f"Processing cluster {config['cluster_name']}")
+    process_cluster(args, config, jinja_env, output_subdir=args.output_subdir)
+
+
 def check_config(cluster_config: dict) -> None:
     """
     Perform basic cluster config checks and raise an exception if anything is found
@@ -357,7 +613,8 @@ def check_config(cluster_config: dict) -> None:
         logger.error(f'No config found for provided cluster name')
         raise RuntimeError
     else:
-        logger.debug(f'Found config for cluster; config: \n{pprint.pformat(cluster_config)}')
+        logger.debug('Found config for cluster; config: \n%s',
+                     _Lazy(lambda: pprint.pformat(cluster_config)))
 
     try:
         group: str = cluster_config['cluster_group']
@@ -421,6 +678,18 @@ def parse_args() -> argparse.Namespace:
                         type=pathlib.Path,
                         default=pathlib.Path('output'),
                         help='path to render kustomize templates; default: $PWD/output')
+    parser.add_argument('-j', '--jobs',
+                        metavar='JOBS',
+                        type=positive_int,
+                        default=os.cpu_count(),
+                        help='number of clusters to hydrate in parallel (requires fork; clusters '
+                             'are hydrated sequentially where unavailable); default: number of '
+                             'CPUs')
+    parser.add_argument('-c', '--compiled-templates',
+                        metavar='COMPILED_TEMPLATES_ZIP',
+                        type=pathlib.Path,
+                        help='zip of precompiled templates to load; (re)compiled from base and '
+                             'overlay templates if missing or out of date')
     parser.add_argument('-s', '--output-subdir',
                         choices=('group', 'cluster', 'none'),
                         default='group',
@@ -452,20 +721,35 @@ def parse_args() -> argparse.Namespace:
     args = parser.parse_args()
 
     # turn all provided paths into fully-resolved absolute paths
-    args.base = args.base.resolve()
-    args.overlay = args.overlay.resolve()
-    args.hydrated = args.hydrated.resolve()
+    try:
+        args.base = args.base.resolve()
+        args.overlay = args.overlay.resolve()
+        args.hydrated = args.hydrated.resolve()
+        if args.compiled_templates:
+            args.compiled_templates = args.compiled_templates.resolve()
+    except RuntimeError as e:  # symlink loop
+        logger.error(e)
+        raise
 
     # tags should be a set
     if args.cluster_tag:
         args.cluster_tag = {t for t in args.cluster_tag}
 
+    # normalize group once for comparison against each cluster's config
+    args.cluster_group_norm = args.cluster_group.strip().lower() if args.cluster_group else None
+
     for item in (args.base, args.overlay):
+        # a single stat covers both the existence and directory checks
         try:
-            assert item.exists(), (f'Provided base templates directory ({item}) does not exist')
-            assert item.is_dir(), (
-                f'Provided base templates directory ({item}) is not a directory')
-            assert not item.is_file(), (
+            mode = os.stat(item).st_mode
+            error = None
+        except FileNotFoundError:
+            mode, error = None, 'does not exist'
+        except OSError as e:
+            mode, error = None, f'could not be accessed: {e.strerror}'
+        try:
+            assert mode is not None, (f'Provided base templates directory ({item}) {error}')
+            assert stat.S_ISDIR(mode), (
                 f'Provided base templates directory ({item}) is not a directory')
         except AssertionError as e:
             logger.error(e)
@@ -482,7 +766,13 @@ def main():
 
     setup_logger(args)
 
-    logger.debug(f'Received args: {pprint.pformat(vars(args))}')
+    # resolve kustomize once, before any clusters are processed
+    try:
+        args.kustomize_bin = resolve_kustomize(args.kustomize)
+    except RuntimeError:
+        sys.exit(1)
+
+    logger.debug('Received args: %s', _Lazy(lambda: pprint.pformat(vars(args))))
 
     # get config from source-of-truth file
     with args.sot_file.open() as f:
@@ -491,64 +781,68 @@ def main():
         except RuntimeError:
             sys.exit(1)
 
-    args.temp()  # create tempdir
-    logger.debug(f'Using temp dir: {args.temp.path}')
-
-    jinja_env = setup_jinja(args.temp.path)  # setup jinja environment
-
-    # a single cluster name is specified
-    if args.cluster_name:
-        cfg = config_data.get(args.cluster_name)
-        logger.info(f'Processing cluster {args.cluster_name}')
-        try:
-            check_config(cfg)
-            process_cluster(args, cfg, jinja_env, output_subdir=args.output_subdir)
-        except (RuntimeError, RuntimeWarning):
-            sys.exit(1)
-    # filter by cluster tags, groups, or process all clusters in config
-    else:
-        for c, cfg in config_data.items():
-            logger.info(f'Processing cluster {c}')
+    # create tempdir; cleaned up once all clusters are processed
+    with args.temp():
+        logger.debug(f'Using temp dir: {args.temp.path}')
+
+        # setup jinja environment once; templates are loaded from the (unchanging) sources
+        jinja_env = setup_jinja(args.base, args.overlay)
+        if args.compiled_templates:
+            # (re)compile unless the zip was built from the current templates
+            digest = templates_digest(args.base, args.overlay)
+            if not compiled_templates_current(args.compiled_templates, digest):
+                compile_templates(jinja_env, args.compiled_templates, digest)
+            jinja_env = setup_jinja(args.base, args.overlay,
+                                    compiled_templates=args.compiled_templates)
+
+        # a single cluster name is specified
+        if args.cluster_name:
+            cfg = config_data.get(args.cluster_name)
+            logger.info(f'Processing cluster {args.cluster_name}')
             try:
                 check_config(cfg)
-            except RuntimeError:
-                continue  # if we encounter something "fatal" to the cluster, move onto the next
-
-            # if tags provided as args
-            if args.cluster_tag:
-                try:
-                    # split config tags into a set
-                    config_tags = {t.strip() for t in cfg['cluster_tags'].split(",")}
-                except KeyError:
-                    logger.warning(f"Cluster '{c}': specified tags as args but has none in config "
-                                   f"file")
-                    continue
-
-                # if config tags don't intersect with tags from args, then don't hydrate cluster
-                if not config_tags.intersection(args.cluster_tag):
-                    logger.debug(f"Cluster '{c}': no matching tags, not hydrating...")
-                    continue
-            if args.cluster_group:
-                if args.cluster_group.strip().lower() != cfg['cluster_group'].strip().lower():
-                    logger.debug(f"Cluster '{c}': not in group '{args.cluster_group}'; not "
-                                 f"hydrating...")
-                    continue
-
-            try:
                 process_cluster(args, cfg, jinja_env, output_subdir=args.output_subdir)
-            except RuntimeError:
-                logger.error('Nothing left to do; exiting without processing all clusters')
+            except (RuntimeError, RuntimeWarning):
                 sys.exit(1)
-            except RuntimeWarning:
-                continue
-            finally:
-                args.temp.cleanup()
-                args.temp()
-                logger.debug(f'Using temp dir: {args.temp.path}')
-                jinja_env = setup_jinja(args.temp.path)
-
-    args.temp.cleanup()
-
+        # filter by cluster tags, groups, or process all clusters in config
+        else:
+            # build the work list up front
+            selected = [cfg for c, cfg in config_data.items() if _select_cluster(c, cfg, args)]
+
+            if not selected:
+                logger.info('No clusters selected; nothing to hydrate')
+            elif 'fork' in multiprocessing.get_all_start_methods():
+                # clusters are independent; hydrate them in parallel, each in its own scratch
+                # subdir.  all workers are forked up front, so don't start more than needed
+                with concurrent.futures.ProcessPoolExecutor(
+                        max_workers=min(args.jobs, len(selected)),
+                        mp_context=multiprocessing.get_context('fork'),
+                        initializer=_init_worker,
+                        initargs=(args, jinja_env)) as executor:
+                    futures = [executor.submit(_process_cluster_worker, cfg) for cfg in selected]
+                    for future in concurrent.futures.as_completed(futures):
+                        try:
+                            future.result()
+                        except RuntimeError:
+                            logger.error('Nothing left to do; exiting without processing all '
+                                         'clusters')
+                            executor.shutdown(cancel_futures=True)
+                            sys.exit(1)
+                        except RuntimeWarning:
+                            continue
+            else:
+                # without fork, args and the jinja environment can't be shared with worker
+                # processes; hydrate sequentially in this process instead
+                logger.debug('fork not available; hydrating clusters sequentially')
+                _init_worker(args, jinja_env)
+                for cfg in selected:
+                    try:
+                        _process_cluster_worker(cfg)
+                    except RuntimeError:
+                        logger.error('Nothing left to do; exiting without processing all clusters')
+                        sys.exit(1)
+                    except RuntimeWarning:
+                        continue
 
 if __name__ == '__main__':
     main()